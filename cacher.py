@@ -1,9 +1,295 @@
+import os
+import math
+import time
+import struct
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
 from pipeable_worker import PipeableWorker
 
 log = logging.getLogger('PastebinCrawler')
 
 
+class WindowCache():
+    """
+    A set like cache that only remembers the most recent items.
+    Items are evicted once there are more than max_size of them or once they
+    are older than max_age seconds (whichever happens first).
+    Notice: Checking an item does not refresh it, only adding it again does
+    """
+
+    def __init__(self, max_size=None, max_age=None, clock=time.monotonic):
+        """
+        :param max_size: Maximum number of items to remember.
+                         Default to no limit.
+        :param max_age: Maximum seconds to remember an item.
+                        Default to no limit.
+        :param clock: A function returning the current time in seconds.
+        """
+        if max_size is None and max_age is None:
+            raise ValueError('WindowCache requires max_size or max_age')
+        self.max_size = max_size
+        self.max_age = max_age
+        self._clock = clock
+        # Maps each item to the time it was added, oldest first
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, item):
+        with self._lock:
+            self._evict()
+            return item in self._items
+
+    def __len__(self):
+        with self._lock:
+            self._evict()
+            return len(self._items)
+
+    def add(self, item, age=0):
+        """
+        :param age: How many seconds ago the item was seen.
+                    Items must be added from the oldest to the newest.
+        """
+        with self._lock:
+            self._items[item] = self._clock() - age
+            self._items.move_to_end(item)
+            self._evict()
+
+    def remove(self, item):
+        with self._lock:
+            # The item may have already been evicted
+            self._items.pop(item, None)
+
+    def _evict(self):
+        """
+        Drops items outside of the window. Should be called with _lock held.
+        """
+        if self.max_size is not None:
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+        if self.max_age is not None:
+            oldest_allowed = self._clock() - self.max_age
+            while self._items and \
+                    next(iter(self._items.values())) < oldest_allowed:
+                self._items.popitem(last=False)
+
+
+def bloom_hashes(item):
+    """
+    Returns the two hashes used by BloomFilter to find an item's bits.
+    A stable hash is used since python's hash() is salted per process
+    and the filter may be saved to disk.
+    Notice: Items are identified by their repr
+    """
+    digest = hashlib.blake2b(
+        repr(item).encode('utf-8'), digest_size=16).digest()
+    first = int.from_bytes(digest[:8], 'little')
+    second = int.from_bytes(digest[8:], 'little') | 1
+    return first, second
+
+
+class BloomFilter():
+    """
+    A fixed size Bloom filter.
+    Holds up to capacity items while keeping the false positive rate
+    under error_rate. Items can not be removed.
+    Notice: Items are identified by their repr
+    """
+
+    def __init__(self, capacity, error_rate, bits=None, count=0):
+        """
+        :param capacity: How many items may be added before the false
+                         positive rate exceeds error_rate.
+        :param error_rate: The wanted false positive rate, between 0 and 1.
+        :param bits: An optional bytearray of a previously saved filter.
+        :param count: How many items were added to the bits.
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.count = count
+        self._bit_count, self._hash_count, byte_count = \
+            self.sizes(capacity, error_rate)
+        if bits is None:
+            bits = bytearray(byte_count)
+        elif len(bits) != byte_count:
+            raise ValueError(f'Expected {byte_count} bytes of bits, '
+                             f'got {len(bits)}')
+        self.bits = bits
+
+    def __contains__(self, item):
+        return self.contains_hashes(*bloom_hashes(item))
+
+    def __len__(self):
+        return self.count
+
+    @staticmethod
+    def sizes(capacity, error_rate):
+        """
+        Returns the bit, hash and byte counts of a filter.
+        Raises ValueError for invalid parameters.
+        """
+        if capacity <= 0:
+            raise ValueError('capacity must be positive')
+        if not 0 < error_rate < 1:
+            raise ValueError('error_rate must be between 0 and 1')
+        bit_count = math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2)
+        hash_count = max(1, round(bit_count / capacity * math.log(2)))
+        return bit_count, hash_count, (bit_count + 7) // 8
+
+    def is_full(self):
+        return self.count >= self.capacity
+
+    def add(self, item):
+        self.add_hashes(*bloom_hashes(item))
+
+    def contains_hashes(self, first, second):
+        """
+        Like "in", but with the result of bloom_hashes.
+        """
+        bits = self.bits
+        bit_count = self._bit_count
+        for i in range(self._hash_count):
+            index = (first + i * second) % bit_count
+            if not bits[index >> 3] & (1 << (index & 7)):
+                return False
+        return True
+
+    def add_hashes(self, first, second):
+        """
+        Like add, but with the result of bloom_hashes.
+        """
+        bits = self.bits
+        bit_count = self._bit_count
+        for i in range(self._hash_count):
+            index = (first + i * second) % bit_count
+            bits[index >> 3] |= 1 << (index & 7)
+        self.count += 1
+
+
+class ScalableBloomFilter():
+    """
+    A set like cache using a memory bound number of bits per item.
+    Grows by chaining Bloom filters, each larger and stricter than the last,
+    so the overall false positive rate stays under error_rate.
+    May be saved to and loaded from disk.
+    Notice: A false positive means a new item will be dropped by the Cacher.
+    Items can not be removed.
+    """
+    MAGIC = b'PBSBF1'
+    HEADER_FORMAT = '<6sdQI'
+    FILTER_HEADER_FORMAT = '<QdQ'
+    GROWTH_FACTOR = 2
+    TIGHTENING_RATIO = 0.5
+    TEMP_SUFFIX = '.tmp'
+
+    def __init__(self, initial_capacity=100000, error_rate=0.001):
+        """
+        :param initial_capacity: The capacity of the first filter.
+        :param error_rate: The wanted overall false positive rate.
+        """
+        if initial_capacity <= 0:
+            raise ValueError('initial_capacity must be positive')
+        if not 0 < error_rate < 1:
+            raise ValueError('error_rate must be between 0 and 1')
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self._filters = []
+        self._lock = threading.Lock()
+
+    def __contains__(self, item):
+        # Hash once for all the filters
+        hashes = bloom_hashes(item)
+        with self._lock:
+            # Newest filters first, recent items are the most likely to repeat
+            return any(bloom.contains_hashes(*hashes)
+                       for bloom in reversed(self._filters))
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(bloom) for bloom in self._filters)
+
+    def add(self, item):
+        hashes = bloom_hashes(item)
+        with self._lock:
+            if not self._filters or self._filters[-1].is_full():
+                self._filters.append(self._new_filter())
+            self._filters[-1].add_hashes(*hashes)
+
+    def remove(self, item):
+        raise TypeError(f'{self.__class__.__name__} does not support removal')
+
+    def _new_filter(self):
+        """
+        Creates the next filter in the chain.
+        The error rates form a geometric series summing up to error_rate.
+        """
+        index = len(self._filters)
+        capacity = self.initial_capacity * self.GROWTH_FACTOR ** index
+        error_rate = self.error_rate * (1 - self.TIGHTENING_RATIO) * \
+            self.TIGHTENING_RATIO ** index
+        log.debug(f'Creating a bloom filter with a capacity of {capacity}')
+        return BloomFilter(capacity, error_rate)
+
+    def save(self, path):
+        """
+        Writes to a temporary file first so a previously saved filter is
+        only replaced by a complete one.
+        """
+        temp_path = f'{path}{self.TEMP_SUFFIX}'
+        try:
+            with self._lock, open(temp_path, 'wb') as bloom_file:
+                bloom_file.write(struct.pack(
+                    self.HEADER_FORMAT, self.MAGIC, self.error_rate,
+                    self.initial_capacity, len(self._filters)))
+                for bloom in self._filters:
+                    bloom_file.write(struct.pack(
+                        self.FILTER_HEADER_FORMAT, bloom.capacity,
+                        bloom.error_rate, bloom.count))
+                    bloom_file.write(bloom.bits)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Raises ValueError if the file is not a valid saved filter
+        """
+        with open(path, 'rb') as bloom_file:
+            remaining = os.fstat(bloom_file.fileno()).st_size
+            magic, error_rate, initial_capacity, filter_count = \
+                cls._read_struct(bloom_file, cls.HEADER_FORMAT)
+            if magic != cls.MAGIC:
+                raise ValueError(f'{path} is not a saved bloom filter')
+            remaining -= struct.calcsize(cls.HEADER_FORMAT)
+            scalable = cls(initial_capacity, error_rate)
+            for _ in range(filter_count):
+                capacity, bloom_error_rate, count = \
+                    cls._read_struct(bloom_file, cls.FILTER_HEADER_FORMAT)
+                remaining -= struct.calcsize(cls.FILTER_HEADER_FORMAT)
+                # Don't trust the header before allocating the bits
+                byte_count = BloomFilter.sizes(capacity, bloom_error_rate)[2]
+                if byte_count > remaining:
+                    raise ValueError('Saved bloom filter is truncated')
+                remaining -= byte_count
+                bloom = BloomFilter(capacity, bloom_error_rate, count=count)
+                if bloom_file.readinto(bloom.bits) != byte_count:
+                    raise ValueError('Saved bloom filter is truncated')
+                scalable._filters.append(bloom)
+        return scalable
+
+    @staticmethod
+    def _read_struct(bloom_file, struct_format):
+        size = struct.calcsize(struct_format)
+        data = bloom_file.read(size)
+        if len(data) != size:
+            raise ValueError('Saved bloom filter is truncated')
+        return struct.unpack(struct_format, data)
+
+
 class Cacher(PipeableWorker):
     """
     This worker caches incoming input and propogates it.
@@ -15,9 +301,16 @@ class Cacher(PipeableWorker):
     # None can only be added artificially to the pipe
     DISABLE_CACHE_VALUES = [None]
 
-    def __init__(self, worker_name=None):
+    def __init__(self, worker_name=None, cache=None):
+        """
+        :param worker_name: A name to be used in log messages.
+                    Default to the class name.
+        :param cache: A set like object with add, remove and "in" support.
+                      Use WindowCache or ScalableBloomFilter to bound memory.
+                      Default to an unbounded set.
+        """
         super().__init__(worker_name=worker_name)
-        self._cache = set()
+        self._cache = set() if cache is None else cache
 
     def work(self, data):
         super().work(data)
@@ -33,5 +326,9 @@ class Cacher(PipeableWorker):
         self._cache.add(data)
 
     def remove_from_cache(self, data):
+        """
+        Notice: Raises TypeError with a ScalableBloomFilter cache,
+        since items can not be removed from it
+        """
         log.debug(f"{self}: Removing {data} from cache")
         self._cache.remove(data)
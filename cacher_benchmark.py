@@ -0,0 +1,66 @@
+"""
+Benchmarks the memory and lookup cost of the Cacher's cache strategies.
+Usage: cacher_benchmark.py [ID_COUNT]
+"""
+
+
+import sys
+import time
+import tracemalloc
+from cacher import WindowCache, ScalableBloomFilter
+
+DEFAULT_ID_COUNT = 10 ** 7
+LOOKUP_COUNT = 10 ** 5
+# Roughly the amount of ids in a few archive pages
+WINDOW_SIZE = 10 ** 4
+
+STRATEGIES = {
+    'set': set,
+    'WindowCache': lambda: WindowCache(max_size=WINDOW_SIZE),
+    'ScalableBloomFilter': lambda: ScalableBloomFilter(error_rate=0.001),
+}
+
+
+def paste_ids(start, stop):
+    """
+    Yields paste id like strings
+    """
+    for i in range(start, stop):
+        yield f'{i:08x}'
+
+
+def benchmark(name, cache_factory, id_count):
+    # Tracing slows down allocations, so only lookups are timed
+    tracemalloc.start()
+    cache = cache_factory()
+    for paste_id in paste_ids(0, id_count):
+        cache.add(paste_id)
+    memory_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    hits = sum(paste_id in cache
+               for paste_id in paste_ids(id_count - LOOKUP_COUNT, id_count))
+    hit_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    false_hits = sum(
+        paste_id in cache
+        for paste_id in paste_ids(id_count, id_count + LOOKUP_COUNT))
+    miss_seconds = time.perf_counter() - start
+
+    print(f'{name}: {memory_bytes / 2 ** 20:.1f} MiB, '
+          f'hit lookup {hit_seconds / LOOKUP_COUNT * 10 ** 6:.2f} us/id, '
+          f'miss lookup {miss_seconds / LOOKUP_COUNT * 10 ** 6:.2f} us/id, '
+          f'recent hits {hits / LOOKUP_COUNT:.2%}, '
+          f'false positives {false_hits / LOOKUP_COUNT:.3%}')
+
+
+def main():
+    id_count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ID_COUNT
+    print(f'Benchmarking {id_count} ids')
+    for name, cache_factory in STRATEGIES.items():
+        benchmark(name, cache_factory, id_count)
+
+
+if __name__ == '__main__':
+    main()
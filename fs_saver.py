@@ -1,10 +1,12 @@
 import json
 import logging
-import glob
+import os
+import time
+import heapq
 import threading
 from pathlib import Path
 from pipeable_worker import PipeableWorker
-from cacher import Cacher
+from cacher import Cacher, WindowCache, ScalableBloomFilter
 
 log = logging.getLogger('PastebinCrawler')
 BASE_FOLDER = Path('.cache')
@@ -46,15 +48,94 @@ class FSCacher(Cacher):
     This worker is similar to the Cacher worker in its normal behavior.
     The difference is that it will initialize the cache by checking the local
     FS for any saved pastes.
+    A WindowCache is only given the newest saved pastes that fit its window.
+    A ScalableBloomFilter cache is instead saved to BLOOM_PATH when finished
+    and loaded from it on the next run if it was created with the same
+    parameters. Pastes saved after it (e.g. after a crash) are added to it,
+    so every saved paste is still checked, but not hashed again.
+    Notice: The saved filter holds every id that passed the cacher, so unlike
+    the other caches, ids that failed to be saved will not be retried
+    after a restart.
     Input: Any hashable
     Output: The input
     Notice: The input must be hashable or a TypeError will be raised
     """
+    BLOOM_PATH = BASE_FOLDER / Path('cache.bloom')
 
     def prepare(self):
         super().prepare()
+        if isinstance(self._cache, ScalableBloomFilter) and \
+                self._load_bloom():
+            return
         log.info(f'{self}: Adding previuse paste from disk to cache')
-        for file_path in \
-                glob.glob(str(BASE_FOLDER / Path('*').with_suffix(SUFFIX))):
-            paste_id = Path(file_path).stem
-            self.add_to_cache(paste_id)
+        if isinstance(self._cache, WindowCache):
+            self._fill_window()
+            return
+        for entry in self._saved_pastes():
+            self.add_to_cache(Path(entry.name).stem)
+
+    def finish(self):
+        try:
+            if isinstance(self._cache, ScalableBloomFilter):
+                log.info(f'{self}: Saving cache to {self.BLOOM_PATH}')
+                BASE_FOLDER.mkdir(exist_ok=True)
+                self._cache.save(self.BLOOM_PATH)
+        finally:
+            super().finish()
+
+    @staticmethod
+    def _saved_pastes():
+        """
+        Lazily yields an os.DirEntry for every saved paste
+        """
+        if not BASE_FOLDER.is_dir():
+            return
+        with os.scandir(BASE_FOLDER) as entries:
+            for entry in entries:
+                if entry.name.endswith(SUFFIX):
+                    yield entry
+
+    def _fill_window(self):
+        """
+        Adds the newest saved pastes that fit in the window, from the oldest
+        to the newest, aged by their modification time.
+        """
+        now = time.time()
+        max_size = self._cache.max_size
+        max_age = self._cache.max_age
+        pastes = ((entry.stat().st_mtime, Path(entry.name).stem)
+                  for entry in self._saved_pastes())
+        if max_age is not None:
+            pastes = (paste for paste in pastes if now - paste[0] <= max_age)
+        if max_size is not None:
+            pastes = heapq.nlargest(max_size, pastes)
+        for mtime, paste_id in sorted(pastes):
+            self._cache.add(paste_id, age=max(0, now - mtime))
+
+    def _load_bloom(self):
+        """
+        Replaces the cache with the saved bloom filter if it can be trusted.
+        Returns whether the filter was loaded.
+        """
+        if not self.BLOOM_PATH.exists():
+            return False
+        try:
+            bloom_mtime = self.BLOOM_PATH.stat().st_mtime
+            bloom = ScalableBloomFilter.load(self.BLOOM_PATH)
+        except (OSError, ValueError):
+            log.warning(f'{self}: Failed loading {self.BLOOM_PATH}, '
+                        f'rebuilding cache', exc_info=True)
+            return False
+        if (bloom.initial_capacity, bloom.error_rate) != \
+                (self._cache.initial_capacity, self._cache.error_rate):
+            log.warning(f'{self}: {self.BLOOM_PATH} was saved with different '
+                        f'parameters, rebuilding cache')
+            return False
+        log.info(f'{self}: Loaded cache from {self.BLOOM_PATH}')
+        self._cache = bloom
+        # The filter is saved while pastes may still be written down the
+        # pipe, or not at all if the previous run did not finish properly
+        for entry in self._saved_pastes():
+            if entry.stat().st_mtime >= bloom_mtime:
+                self.add_to_cache(Path(entry.name).stem)
+        return True
@@ -0,0 +1,190 @@
+import os
+import struct
+import time
+import pytest
+from cacher import Cacher, WindowCache, ScalableBloomFilter
+from fs_saver import FSCacher, BASE_FOLDER, SUFFIX
+
+
+class FakeClock():
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def cache_folder(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    BASE_FOLDER.mkdir()
+    return BASE_FOLDER
+
+
+def save_paste(paste_id, mtime):
+    paste_path = BASE_FOLDER / f'{paste_id}{SUFFIX}'
+    paste_path.write_text('{}')
+    os.utime(paste_path, (mtime, mtime))
+
+
+def test_window_evicts_by_size():
+    cache = WindowCache(max_size=2)
+    for paste_id in ('a', 'b', 'c'):
+        cache.add(paste_id)
+    assert 'a' not in cache
+    assert 'b' in cache and 'c' in cache
+    assert len(cache) == 2
+
+
+def test_window_evicts_by_age():
+    clock = FakeClock()
+    cache = WindowCache(max_age=10, clock=clock)
+    cache.add('a')
+    clock.now = 5
+    cache.add('b')
+    cache.add('c', age=6)
+    clock.now = 12
+    assert 'a' not in cache
+    assert 'b' in cache
+    clock.now = 16
+    assert 'b' not in cache
+    assert len(cache) == 0
+
+
+def test_window_remove_evicted():
+    cacher = Cacher(cache=WindowCache(max_size=2))
+    for paste_id in ('a', 'b', 'c'):
+        cacher.work(paste_id)
+    cacher.remove_from_cache('a')
+    cacher.remove_from_cache('b')
+    assert cacher.work('b') == 'b'
+
+
+def test_cacher_drops_seen():
+    cacher = Cacher(cache=ScalableBloomFilter(initial_capacity=10))
+    assert cacher.work('a') == 'a'
+    assert cacher.work('a') is None
+    with pytest.raises(TypeError):
+        cacher.remove_from_cache('a')
+
+
+def test_bloom_invalid_parameters():
+    with pytest.raises(ValueError):
+        ScalableBloomFilter(initial_capacity=0)
+    with pytest.raises(ValueError):
+        ScalableBloomFilter(error_rate=1)
+
+
+def test_bloom_grows_and_round_trips(tmp_path):
+    bloom = ScalableBloomFilter(initial_capacity=100, error_rate=0.01)
+    paste_ids = [f'{i:08x}' for i in range(1000)]
+    for paste_id in paste_ids:
+        bloom.add(paste_id)
+    assert len(bloom._filters) > 1
+    bloom_path = tmp_path / 'cache.bloom'
+    bloom.save(bloom_path)
+    assert os.listdir(tmp_path) == ['cache.bloom']
+    loaded = ScalableBloomFilter.load(bloom_path)
+    assert len(loaded) == len(paste_ids)
+    assert all(paste_id in loaded for paste_id in paste_ids)
+    false_hits = sum(f'new{i}' in loaded for i in range(1000))
+    assert false_hits < 50
+
+
+def test_bloom_load_truncated(tmp_path):
+    bloom = ScalableBloomFilter(initial_capacity=100)
+    bloom.add('a')
+    bloom_path = tmp_path / 'cache.bloom'
+    bloom.save(bloom_path)
+    data = bloom_path.read_bytes()
+    for size in (0, 10, len(data) - 1):
+        bloom_path.write_bytes(data[:size])
+        with pytest.raises(ValueError):
+            ScalableBloomFilter.load(bloom_path)
+
+
+def test_bloom_load_huge_capacity(tmp_path):
+    bloom_path = tmp_path / 'cache.bloom'
+    bloom_path.write_bytes(
+        struct.pack(ScalableBloomFilter.HEADER_FORMAT,
+                    ScalableBloomFilter.MAGIC, 0.001, 100, 1) +
+        struct.pack(ScalableBloomFilter.FILTER_HEADER_FORMAT,
+                    2 ** 62, 0.001, 0))
+    with pytest.raises(ValueError):
+        ScalableBloomFilter.load(bloom_path)
+
+
+def test_fs_cacher_set(cache_folder):
+    save_paste('a', 1000)
+    cacher = FSCacher()
+    cacher.prepare()
+    cacher.finish()
+    assert cacher.work('a') is None
+    assert cacher.work('b') == 'b'
+
+
+def test_fs_cacher_window_takes_newest(cache_folder):
+    for i in range(10):
+        save_paste(f'p{i}', 1000 + i)
+    cacher = FSCacher(cache=WindowCache(max_size=3))
+    cacher.prepare()
+    assert [f'p{i}' in cacher._cache for i in range(10)] == \
+        [False] * 7 + [True] * 3
+
+
+def test_fs_cacher_window_skips_old(cache_folder):
+    now = time.time()
+    save_paste('old', now - 100)
+    save_paste('new', now - 1)
+    cacher = FSCacher(cache=WindowCache(max_age=50))
+    cacher.prepare()
+    assert 'old' not in cacher._cache
+    assert 'new' in cacher._cache
+
+
+def test_fs_cacher_bloom_round_trip(cache_folder):
+    now = time.time()
+    save_paste('a', now - 100)
+    cacher = FSCacher(cache=ScalableBloomFilter(error_rate=0.01))
+    cacher.prepare()
+    cacher.work('failed')
+    cacher.finish()
+    os.utime(FSCacher.BLOOM_PATH, (now - 50, now - 50))
+    # Saved after the filter, as if by the rest of the pipe
+    save_paste('b', now - 10)
+
+    cacher = FSCacher(cache=ScalableBloomFilter(error_rate=0.01))
+    cacher.prepare()
+    assert len(cacher._cache) == 3
+    assert 'a' in cacher._cache and 'b' in cacher._cache
+    assert 'failed' in cacher._cache
+
+
+def test_fs_cacher_bloom_mismatch_rebuilds(cache_folder):
+    save_paste('a', 1000)
+    cacher = FSCacher(cache=ScalableBloomFilter(error_rate=0.01))
+    cacher.prepare()
+    cacher.work('failed')
+    cacher.finish()
+
+    cacher = FSCacher(cache=ScalableBloomFilter(error_rate=0.001))
+    cacher.prepare()
+    assert cacher._cache.error_rate == 0.001
+    assert 'a' in cacher._cache
+    assert 'failed' not in cacher._cache
+
+
+def test_fs_cacher_bloom_corrupt_rebuilds(cache_folder):
+    save_paste('a', 1000)
+    FSCacher.BLOOM_PATH.write_bytes(b'junk')
+    cacher = FSCacher(cache=ScalableBloomFilter())
+    cacher.prepare()
+    assert 'a' in cacher._cache
+
+
+def test_fs_cacher_bloom_unreadable_rebuilds(cache_folder):
+    save_paste('a', 1000)
+    FSCacher.BLOOM_PATH.mkdir()
+    cacher = FSCacher(cache=ScalableBloomFilter())
+    cacher.prepare()
+    assert 'a' in cacher._cache